@@ -1,15 +1,488 @@
 import pandas as pd
-from statistics import NormalDist
-from statistics import variance
-from scipy.stats import f
-from scipy.stats import chi2
-from numpy import log
+import numpy as np
+from scipy.special import chdtri
+from scipy.special import chdtrc
+from scipy.special import fdtrc
+from scipy.special import ndtr
+from scipy.special import ndtri
+from scipy.optimize import brentq
+from numpy import log1p
+from collections import namedtuple
+from functools import lru_cache
+from math import fsum
+from math import isfinite
+
+def _groupStats(codes, x, k):
+    '''
+    sample size, mean, and variance per category
+    
+    The codes are the category numbers (0 to k-1) of the scores in x. Counts and sums are accumulated with np.bincount, which streams over x without sorting. The variance is taken from the squared deviations of each score from its category mean, instead of the sum of squares minus the squared sum, so it does not lose precision when the scores are large compared to their spread.
+    '''
+    nj = np.bincount(codes, minlength=k)
+    meanj = np.bincount(codes, weights=x, minlength=k)/nj
+    dev = x - meanj[codes]
+    varj = np.bincount(codes, weights=dev*dev, minlength=k)/(nj - 1)
+    return nj, meanj, varj
 
-def meansTest(data, groups, scores, test, alpha=0.05, iters=False, order=2, alt=False):
+def _findRoot(fun, low, high, rtol=1e-12, maxiter=100):
     '''
-    meansTest
-     
-    This function can perform various one-way anovas (comparisons of means)
+    root of a monotone function between low and high using Brent's method
+    
+    The search stops once the root is known up to a relative tolerance (rtol), so small p-values get the same number of correct digits as large ones. If the function does not change sign in the bracket, the bound closest to a root is returned instead. If the function is not finite (e.g. from a category that is too small), nan is returned. The bounds are only evaluated separately in those cases, brentq already evaluates them itself.
+    '''
+    try:
+        return brentq(fun, low, high, xtol=1e-300, rtol=rtol, maxiter=maxiter)
+    except ValueError:
+        fLow = fun(low)
+        fHigh = fun(high)
+        if not (isfinite(fLow) and isfinite(fHigh)) or fLow*fHigh < 0:
+            return np.nan
+        return low if abs(fLow) < abs(fHigh) else high
+
+@lru_cache(maxsize=256)
+def _chiCrit(df, alpha):
+    '''
+    critical chi-square value for a given alpha level
+    
+    Most calls use the same few alpha levels and numbers of categories, so the quantiles are kept in a small cache instead of being recalculated for each test.
+    '''
+    return float(chdtri(df, alpha))
+
+def _jamesFirstCrit(cCrit, k, lamb):
+    '''
+    critical J-value for the first-order James test
+    '''
+    return cCrit*(1 + (3*cCrit  + k + 1)/(2*(k*k - 1))*lamb)
+
+def _jamesMoments(hj, vj):
+    '''
+    the R values of the second-order James test
+    
+    These are sums over the categories of the powers of h divided by powers of v, so they only need the per category values and not the scores themselves. They are calculated once as a single product of the powers of h (rows) with 1/v and 1/v^2 (columns), and returned as plain floats in the order R10, R11, R12, R20, R21, R22, R23.
+    '''
+    hPow = np.vstack([np.ones_like(hj), hj, hj*hj, hj*hj*hj])
+    vInv = 1.0/vj
+    vInv = np.vstack([vInv, vInv*vInv])
+    Rmat = hPow @ vInv.T
+    
+    R10 = float(Rmat[0, 0])
+    R11 = float(Rmat[1, 0])
+    R12 = float(Rmat[2, 0])
+    R20 = float(Rmat[0, 1])
+    R21 = float(Rmat[1, 1])
+    R22 = float(Rmat[2, 1])
+    R23 = float(Rmat[3, 1])
+    return R10, R11, R12, R20, R21, R22, R23
+
+def _jamesSecondCoefs(R10, R11, R12, R20, R21, R22, R23):
+    '''
+    the parts of the second-order James critical value that only depend on the R values
+    
+    These do not change during the p-value iterations, so they are calculated once.
+    '''
+    R10sq = R10*R10
+    R11sq = R11*R11
+    R12sq = R12*R12
+    R12R11 = R12*R11
+    R12R10 = R12*R10
+    R11R10 = R11*R10
+    R22sq = R22*R22
+    
+    #sums of terms with mixed signs, added with compensated summation so no precision is lost to cancellation
+    #fsum raises on inf - inf (a category of two scores has v = n - 2 = 0), the plain sum then gives nan as before
+    add = fsum if all(map(isfinite, (R10, R11, R12, R20, R21, R22, R23))) else sum
+    X = add((8*R23, -10*R22, 4*R21, -6*R12sq, 8*R12R11, -4*R11sq))
+    Y = add((2*R23, -4*R22, 2*R21, -2*R12sq, 4*R12R11, -2*R11sq))
+    F = add((-R12sq, 4*R12R11, -2*R12R10, -4*R11sq, 4*R11R10, -R10sq))
+    E = add((R23, -3*R22, 3*R21, -R20))
+    A = add((R12sq, -4*R23, 6*R22, -4*R21, R20))
+    B = add((-2*R22sq, 4*R21, -R20, 2*R12R10, -4*R11R10, R10sq))
+    C = R11sq - R22
+    D = R23 - R12R11
+    return X, Y, F, E, A, B, C, D
+
+def _jamesSecondPoly(k, lamb, X, Y, F, E, A, B, C, D):
+    '''
+    coefficients of the second-order James critical J-value as a polynomial in the critical chi-square value
+    
+    The chi values c2 to c8 are the critical chi-square value to the power 1 to 4, divided by (k - 1), (k - 1)(k + 1), (k - 1)(k + 1)(k + 3) and (k - 1)(k + 1)(k + 3)(k + 5). The critical J-value is therefore a polynomial of degree 4 in the critical chi-square value, without a constant term. The X to F values are from _jamesSecondCoefs. The coefficients only depend on k, lambda, and the R values, so they are calculated once before the p-value iterations.
+    '''
+    #divisors of the chi values, in numpy floats so k = 1 gives inf instead of an error
+    u2 = 1/np.float64(k - 1)
+    u4 = u2/(k + 1)
+    u6 = u4/(k + 3)
+    u8 = u6/(k + 5)
+    
+    #c42 = 3*c4 + c2 = p1*c + p2*c^2
+    p1 = u2
+    p2 = 3*u4
+    
+    #X + Y*(c2 - 1) + F*(3*c4 - 2*c2 - 1)/4 = q0 + q1*c + q2*c^2
+    q0 = X - Y - F/4
+    q1 = (Y - F/2)*u2
+    q2 = 3*F*u4/4
+    
+    #the E to D terms, per power of the critical chi-square value
+    e1 = E + 15*A/16 - B/16 + C/4 + 3*D/4
+    e2 = 2*E + 27*A/16 - 5*B/16 + C/4 + 7*D/4
+    e3 = 5*E + 45*A/16 - 3*B/16 + 3*C/4 + 9*D/4
+    e4 = 105*A/16 + 9*B/16 + 27*C/4 + 45*D/4
+    
+    #lambda terms: c42*lamb/2 and lamb^2/16*c42*(c42 - (k - 3)*c42/c)
+    l1 = lamb/2
+    l2 = lamb*lamb/16
+    m = k - 3
+    
+    g1 = 1 + l1*p1 - l2*m*p1*p1 + p1*q0/2 + e1*u2
+    g2 = l1*p2 + l2*(p1*p1 - 2*m*p1*p2) + (p1*q1 + p2*q0)/2 + e2*u4
+    g3 = l2*(2*p1*p2 - m*p2*p2) + (p1*q2 + p2*q1)/2 + e3*u6
+    g4 = l2*p2*p2 + p2*q2/2 + e4*u8
+    return float(g1), float(g2), float(g3), float(g4)
+
+def _jamesSecondEval(cCrit, g1, g2, g3, g4):
+    '''
+    critical J-value for the second-order James test from the coefficients of _jamesSecondPoly, using Horner's scheme
+    
+    This is evaluated many times in the p-value iterations, so all arguments should be plain Python floats: arithmetic on numpy scalars is several times slower.
+    '''
+    return cCrit*(g1 + cCrit*(g2 + cCrit*(g3 + cCrit*g4)))
+
+def _ozdemirKurtStat(zCrit, vj, vj2, sqrtVj, logTj):
+    '''
+    Özdemir-Kurt B2 statistic for a given critical z-value
+    
+    The parts that do not depend on the critical z-value (v, v^2, the square root of v, and the log term of the t-values) are passed in, so only the c-values are recalculated during the iterations.
+    '''
+    zCrit2 = zCrit*zCrit
+    cj = (4*vj2 + 5*(2*zCrit2 + 3)/24)/(vj*(4*vj + 1) + (4*zCrit2 + 9)/12) * sqrtVj
+    return np.dot(cj*cj, logTj)
+
+def _overall(nj, meanj):
+    '''
+    overall sample size and mean
+    '''
+    n = nj.sum()
+    mean = np.dot(nj, meanj)/n
+    return n, mean
+
+def _weighted(wj, meanj):
+    '''
+    adjusted weights (h) and weighted mean for given weights (w)
+    '''
+    w = wj.sum()
+    hj = wj/w
+    yw = np.dot(hj, meanj)
+    return hj, yw
+
+def _cochranStat(wj, meanj, yw):
+    '''
+    cochran test statistic for given weights (w) and weighted mean
+    '''
+    return np.dot(wj, (meanj - yw)**2)
+
+def _lambda(hj, vj):
+    '''
+    lambda for given adjusted weights (h) and denominators (v)
+    '''
+    return ((1 - hj)**2/vj).sum()
+
+def _tValues(nj, meanj, varj, mean):
+    '''
+    t-values of the category means against a given overall mean
+    '''
+    return (meanj - mean)/(varj/nj)**0.5
+
+def _welchF(wj, nj, meanj, k):
+    '''
+    Welch type F statistic and second degrees of freedom for given weights (w)
+    '''
+    hj, yw = _weighted(wj, meanj)
+    chi2Cochran = _cochranStat(wj, meanj, yw)
+    lamb = _lambda(hj, nj - 1)
+    Fstat = chi2Cochran / (k - 1 + 2*(k - 2)/(k + 1)*lamb)
+    df2 = (k**2 - 1)/(3*lamb)
+    return Fstat, df2
+
+#test handlers
+#each returns the test statistic, the degrees of freedom, a p-value or critical J-value if the test determines these itself, and a comment
+
+def _fisher(nj, meanj, varj, k, alpha, iters, order, alt):
+    n, mean = _overall(nj, meanj)
+    ssb = np.dot(nj, (meanj - mean)**2)
+    #within sum of squares, a category with one score adds nothing (its variance is nan)
+    many = nj > 1
+    ssw = np.dot(nj[many] - 1, varj[many])
+    df1 = k - 1
+    df2 = n - k
+    Fstat = (ssb/df1)/(ssw/df2)
+    return Fstat, df1, df2, None, None, None
+
+def _box(nj, meanj, varj, k, alpha, iters, order, alt):
+    Fstat = _fisher(nj, meanj, varj, k, alpha, iters, order, alt)[0]
+    n = nj.sum()
+    c = (n - k)/(n*(k - 1))*np.dot(n - nj, varj) / np.dot(nj - 1, varj)
+    Fstat = Fstat/c
+    df1 = np.dot(n - nj, varj)**2 / (np.dot(nj, varj)**2 + n*np.dot(n - 2*nj, varj**2))
+    df2 = np.dot(nj - 1, varj)**2 / np.dot(nj - 1, varj**2)
+    return Fstat, df1, df2, None, None, None
+
+def _cochran(nj, meanj, varj, k, alpha, iters, order, alt):
+    wj = nj/varj
+    yw = _weighted(wj, meanj)[1]
+    chi2Stat = _cochranStat(wj, meanj, yw)
+    return chi2Stat, k - 1, None, None, None, None
+
+def _welch(nj, meanj, varj, k, alpha, iters, order, alt):
+    Fstat, df2 = _welchF(nj/varj, nj, meanj, k)
+    return Fstat, k - 1, df2, None, None, None
+
+def _hartungAgacMakabi(nj, meanj, varj, k, alpha, iters, order, alt):
+    if alt:
+        phij = (nj - 1)/(nj - 3)
+    else:
+        phij = (nj + 2)/(nj + 1)
+    Fstat, df2 = _welchF(nj/varj * 1/phij, nj, meanj, k)
+    return Fstat, k - 1, df2, None, None, None
+
+def _scottSmith(nj, meanj, varj, k, alpha, iters, order, alt):
+    n, mean = _overall(nj, meanj)
+    tj = _tValues(nj, meanj, varj, mean)
+    chi2Stat = ((tj*((nj - 3)/(nj - 1))**0.5)**2).sum()
+    return chi2Stat, k, None, None, None, None
+
+def _brownForsythe(nj, meanj, varj, k, alpha, iters, order, alt):
+    n, mean = _overall(nj, meanj)
+    Fstat = np.dot(nj, (meanj - mean)**2)/np.dot(1 - nj/n, varj)
+    df2 = np.dot(1 - nj/n, varj)**2/((1 - nj/n)**2*varj**2/(nj - 1)).sum()
+    return Fstat, k - 1, df2, None, None, None
+
+def _mehrotra(nj, meanj, varj, k, alpha, iters, order, alt):
+    bf = _brownForsythe(nj, meanj, varj, k, alpha, iters, order, alt)
+    Fstat, df2 = bf[0], bf[2]
+    n = nj.sum()
+    df1 = (varj.sum() - np.dot(nj, varj)/n)**2 / (np.dot(varj, varj) + (np.dot(nj, varj)/n)**2 - 2*np.dot(nj, varj**2)/n)
+    return Fstat, df1, df2, None, None, None
+
+def _alexanderGovern(nj, meanj, varj, k, alpha, iters, order, alt):
+    yw = _weighted(nj/varj, meanj)[1]
+    tj = _tValues(nj, meanj, varj, yw)
+    aj = nj - 1.5
+    bj = 48*aj**2
+    cj = (aj*log1p(tj*tj/(nj - 1)))**0.5
+    #polynomial parts in Horner form
+    cj2 = cj*cj
+    cj4 = cj2*cj2
+    num = cj*(855.0 + cj2*(240.0 + cj2*(33.0 + 4.0*cj2)))
+    den = 1000.0*bj + bj*(10.0*bj + 8.0*cj4)
+    zj = cj + (cj2*cj + 3.0*cj)/bj - num/den
+    chi2Stat = np.dot(zj, zj)
+    return chi2Stat, k - 1, None, None, None, None
+
+def _ozdemirKurt(nj, meanj, varj, k, alpha, iters, order, alt):
+    comment = None
+    yw = _weighted(nj/varj, meanj)[1]
+    tj = _tValues(nj, meanj, varj, yw)
+    vj = nj - 1
+    vj2 = vj*vj
+    sqrtVj = vj**0.5
+    logTj = log1p(tj*tj/vj)
+    
+    if iters:
+        comment = "using iterations for approximating p-value"
+        df = k - 1
+        
+        #critical z-value for which the B2 statistic equals the critical chi-square value, at the same p-value.
+        #Searching on z instead of on the p-value only needs the distribution functions, not their inverses.
+        zLow, zHigh = ndtri(1 - np.array([1 - 1e-12, 1e-12])/2)
+        zCrit = _findRoot(lambda z: chdtrc(df, _ozdemirKurtStat(z, vj, vj2, sqrtVj, logTj)) - 2*ndtr(-z), zLow, zHigh)
+        chi2Stat = _ozdemirKurtStat(zCrit, vj, vj2, sqrtVj, logTj)
+    else:
+        zCrit = ndtri(1 - alpha/2)
+        chi2Stat = _ozdemirKurtStat(zCrit, vj, vj2, sqrtVj, logTj)
+    
+    return chi2Stat, k - 1, None, None, None, comment
+
+def _james(nj, meanj, varj, k, alpha, iters, order, alt):
+    wj = nj/varj
+    hj, yw = _weighted(wj, meanj)
+    J = _cochranStat(wj, meanj, yw)
+    df1 = k - 1
+    pVal = None
+    Jcrit = None
+    
+    if order==0:
+        pVal = chdtrc(df1, J) 
+        comment = "for large category sizes"
+        
+    elif order==1:
+        lamb = float(_lambda(hj, nj - 1))
+        
+        if iters:
+            comment = "first-order with iterations for p-value approximation"
+            #root on the critical chi-square value, only converted to a p-value at the end
+            cCrit = _findRoot(lambda c: _jamesFirstCrit(c, k, lamb) - J, 0, chdtri(df1, 1e-12))
+            pVal = chdtrc(df1, cCrit)
+            
+        else:
+            comment = "first-order"
+            Jcrit = _jamesFirstCrit(_chiCrit(df1, float(alpha)), k, lamb)
+            
+    else:
+        if not(alt):
+            comment = "second order"
+            vj = nj - 2
+            lamb = float(_lambda(hj, vj))
+        else:
+            comment = "second order with alternative v (v = n -1)"
+            vj = nj - 1
+            lamb = float(_lambda(hj, vj))
+        
+        coefs = _jamesSecondCoefs(*_jamesMoments(hj, vj))
+        g = _jamesSecondPoly(k, lamb, *coefs)
+        
+        if iters:
+            comment = comment + ", using iterations for p-value approximation"
+            #both bounds of the search in one quantile call
+            cLow, cHigh = chdtri(df1, [1 - 1e-12, 1e-12])
+            cCrit = _findRoot(lambda c: _jamesSecondEval(c, *g) - J, cLow, cHigh)
+            pVal = chdtrc(df1, cCrit)
+        else:
+            Jcrit = _jamesSecondEval(_chiCrit(df1, float(alpha)), *g)
+    
+    return J, df1, None, pVal, Jcrit, comment
+
+_TESTS = {'fisher' : _fisher, 
+          'cochran': _cochran,
+          'welch' : _welch, 
+          'james' : _james, 
+          'box' : _box, 
+          'scott-smith': _scottSmith, 
+          'brown-forsythe' : _brownForsythe, 
+          'alexander-govern' : _alexanderGovern, 
+          'mehrotra' : _mehrotra, 
+          'hartung-agac-makabi' : _hartungAgacMakabi, 
+          'ozdemir-kurt' : _ozdemirKurt}
+
+#full names of the tests, as shown in the results
+_NAMES = {'fisher' : "Fisher one-way anova", 
+          'cochran': "Cochran for Means",
+          'welch' : "Welch one-way anova", 
+          'james' : "James test", 
+          'box' : "Box correction for Fisher", 
+          'scott-smith': "Scott and Smith", 
+          'brown-forsythe' : "Brown-Forsythe for Means", 
+          'alexander-govern' : "Alexander-Govern", 
+          'mehrotra' : "Mehrotra modified Brown-Forsythe", 
+          'hartung-agac-makabi' : "Hartung-Agac-Makabi adjusted Welch", 
+          'ozdemir-kurt' : "Özdermir-Kurt B2"}
+
+#tests with an F-distributed or chi-square distributed statistic
+_F_TESTS = frozenset({'fisher', 'box', 'welch', 'brown-forsythe', 'mehrotra', 'hartung-agac-makabi'})
+_CHI2_TESTS = frozenset({'cochran', 'scott-smith', 'alexander-govern', 'ozdemir-kurt'})
+
+#tests with a critical value (James) or statistic (Ozdemir-Kurt) at the alpha level, unless iterations are used
+_ALPHA_TESTS = frozenset({'james', 'ozdemir-kurt'})
+
+def _testStats(test, nj, meanj, varj, k, alpha, iters, order, alt):
+    '''
+    test statistic, degrees of freedom, and p-value or critical J-value from the handler of the test
+    
+    With fewer than two categories there is nothing to compare, and several of the formulas divide by k - 1 or k^2 - 1. Every test then gives nan for the statistic and the p-value (or critical J-value), instead of an error or a misleading value.
+    '''
+    if k < 2:
+        comment = "at least two categories are needed"
+        df2 = np.nan if test in _F_TESTS else None
+        return np.nan, k - 1, df2, np.nan, None, comment
+    
+    return _TESTS[test](nj, meanj, varj, k, alpha, iters, order, alt)
+
+#result columns for tests with a p-value from the F or chi-square distribution, and for James tests with a critical J-value
+_COLS_F = ("statistic", "df1", "df2", "p-value", "reject H0", "test", "comment")
+_COLS_CHI2 = ("statistic", "df1", "p-value", "reject H0", "test", "comment")
+_COLS_J = ("statistic", "df1", "J-critical", "reject H0", "test", "comment")
+
+#result handlers
+#each returns the p-value, the rejection, the result row (without the test and comment), and its columns
+def _fResult(stat, df1, df2, pVal, Jcrit, alpha):
+    '''
+    p-value, rejection, and result row for an F-distributed test statistic
+    '''
+    pVal = fdtrc(df1, df2, stat)
+    reject = pVal < alpha
+    return pVal, reject, [stat, df1, df2, pVal, reject], _COLS_F
+
+def _chi2Result(stat, df1, df2, pVal, Jcrit, alpha):
+    '''
+    p-value, rejection, and result row for a chi-square distributed test statistic
+    '''
+    pVal = chdtrc(df1, stat)
+    reject = pVal < alpha
+    return pVal, reject, [stat, df1, pVal, reject], _COLS_CHI2
+
+def _jamesResult(stat, df1, df2, pVal, Jcrit, alpha):
+    '''
+    rejection and result row for the James test, using the p-value or the critical J-value from _james
+    '''
+    if Jcrit is None:
+        reject = pVal < alpha
+        return pVal, reject, [stat, df1, pVal, reject], _COLS_CHI2
+    reject = stat > Jcrit
+    return pVal, reject, [stat, df1, Jcrit, reject], _COLS_J
+
+_HANDLERS = {**dict.fromkeys(_F_TESTS, _fResult), **dict.fromkeys(_CHI2_TESTS, _chi2Result), 'james' : _jamesResult}
+
+#the result types of meansTest
+_OUTPUTS = frozenset({'pandas', 'tuple', 'numpy'})
+
+#light-weight result for output='tuple', fields that do not apply to the test are None
+TestResult = namedtuple('TestResult', ['statistic', 'df1', 'df2', 'pValue', 'Jcrit', 'reject', 'test', 'comment'])
+
+#record type for output='numpy', fields that do not apply to the test are NaN
+_RESULT_DTYPE = np.dtype([('statistic', 'f8'), ('df1', 'f8'), ('df2', 'f8'), ('p-value', 'f8'), ('J-critical', 'f8'), ('reject H0', '?')])
+
+def _record(stat, df1, df2, pVal, Jcrit, reject):
+    '''
+    one result as a record of _RESULT_DTYPE
+    '''
+    return tuple(np.nan if v is None else v for v in (stat, df1, df2, pVal, Jcrit)) + (reject,)
+
+def _alphaLevels(nj, meanj, varj, k, alphas, test, iters, order, alt, output):
+    '''
+    results of meansTest for an array of alpha levels, one result per alpha level
+    
+    For most tests only the rejection depends on alpha, so the test is done once and all rejections come from one np.less. The tests in _ALPHA_TESTS without iterations use alpha in their critical value or statistic, so for those the test is done for each alpha level.
+    '''
+    name = _NAMES[test]
+    
+    if iters or test not in _ALPHA_TESTS:
+        stat, df1, df2, pVal, Jcrit, comment = _testStats(test, nj, meanj, varj, k, alphas[0], iters, order, alt)
+        pVal, reject, row, cols = _HANDLERS[test](stat, df1, df2, pVal, Jcrit, alphas)
+        results = [(stat, df1, df2, pVal, Jcrit, rej) for rej in reject]
+        rows = [row[:-1] + [rej, name, comment] for rej in reject]
+    else:
+        results = []
+        rows = []
+        for alpha in alphas:
+            stat, df1, df2, pVal, Jcrit, comment = _testStats(test, nj, meanj, varj, k, alpha, iters, order, alt)
+            pVal, reject, row, cols = _HANDLERS[test](stat, df1, df2, pVal, Jcrit, alpha)
+            results.append((stat, df1, df2, pVal, Jcrit, reject))
+            rows.append(row + [name, comment])
+    
+    if output=='tuple':
+        return [TestResult(*result, name, comment) for result in results]
+    if output=='numpy':
+        return np.array([_record(*result) for result in results], dtype=_RESULT_DTYPE)
+    
+    out = pd.DataFrame(rows, columns=cols)
+    out.insert(0, "alpha", alphas)
+    
+    return out
+
+class GroupStats:
+    '''
+    GroupStats
+    
+    The sample size, mean, and variance per category, calculated once so they can be re-used for multiple tests on the same data.
     
     Parameters
     ----------
@@ -19,21 +492,81 @@ def meansTest(data, groups, scores, test, alpha=0.05, iters=False, order=2, alt=
         The name of the column with the groups 
     scores : string
         The name of the column with the scores
+    
+    Attributes
+    ----------
+    categories : pandas Index
+        the categories, in order of appearance
+    k : integer
+        the number of categories
+    n : numpy array
+        the sample size per category
+    mean : numpy array
+        the mean per category
+    var : numpy array
+        the variance per category
+    
+    Examples
+    ---------
+    >>> stats = GroupStats(df, 'Location', 'Over_Grade')
+    >>> meansTest(stats, 'Location', 'Over_Grade', test='welch')
+    >>> meansTest(stats, 'Location', 'Over_Grade', test='brown-forsythe')
+    
+    '''
+    
+    def __init__(self, data, groups, scores):
+        #one unsorted factorize of the groups, only observed categories get a code
+        codes, self.categories = pd.factorize(data[groups], sort=False)
+        x = data[scores].to_numpy(dtype=np.float64)
+        
+        #remove missing groups or scores, without copying if there are none
+        keep = (codes >= 0) & ~np.isnan(x)
+        if not keep.all():
+            codes = codes[keep]
+            x = x[keep]
+        
+        #number of categories
+        self.k = len(self.categories)
+        
+        self.n, self.mean, self.var = _groupStats(codes, x, self.k)
+
+def meansTest(data, groups, scores, test, alpha=0.05, iters=False, order=2, alt=False, output='pandas'):
+    '''
+    meansTest
+     
+    This function can perform various one-way anovas (comparisons of means)
+    
+    Parameters
+    ----------
+    data : pandas dataframe or GroupStats
+        A pandas dataframe, or the GroupStats of one to re-use for multiple tests
+    groups : string
+        The name of the column with the groups. Not used if data is a GroupStats
+    scores : string
+        The name of the column with the scores. Not used if data is a GroupStats
     test : string
         to indicate which test to use. Options are 'fisher', 'cochran', 'welch', 'james', 'box', 'scott-smith', 'brown-forsythe', 'alexander-govern', 'mehrotra', 'hartung-agac-makabi', and 'ozdermir-kurt'
-    alpha : float between 0 and 1
-        Alpha level to be used
+    alpha : float between 0 and 1, or array-like of these
+        Alpha level to be used. With several alpha levels (e.g. from a multiple testing correction) there is one result per alpha level
     iters : boolean
         to indicate the use of an iteration approach. Only applies to James and Ozdemir-Kurt
     order : integer 0, 1 or 2
         to indicate the James test order. 0 for large sample approximation, 1 for first order and 2 for second order
     alt : boolean
         to indicate the use of an alternative calculation. Only applies to James and Hartung-Agac-Makabi
+    output : string
+        to indicate the type of result. Either 'pandas' (default) for a dataframe, 'tuple' for a TestResult named tuple, or 'numpy' for a numpy structured array. The last two avoid the cost of creating a dataframe when the function is called many times (e.g. in simulations)
     
     Returns
     -------
     out : Pandas dataframe
         a dataframe with the test results. This usually has the test-statistic value, degrees of freedom, p-value, name of the test used, a comment if applicable, a boolean to reject the null hypothesis or not (based on the alpha level). In some cases a critical value is shown to compare to the test-statistic.
+        
+        With output='tuple' a TestResult with the fields statistic, df1, df2, pValue, Jcrit, reject, test, and comment is returned instead. Fields that do not apply to the test are None.
+        
+        With output='numpy' a structured array of length one is returned, with the fields 'statistic', 'df1', 'df2', 'p-value', 'J-critical', and 'reject H0'. Fields that do not apply to the test are NaN. Results of many calls can be joined with np.concatenate.
+        
+        If alpha has several values, the dataframe has one row per alpha level and an extra 'alpha' column, output='tuple' gives a list of TestResult, and output='numpy' a structured array with one record per alpha level.
    
     Notes
     -----
@@ -327,6 +860,8 @@ def meansTest(data, groups, scores, test, alpha=0.05, iters=False, order=2, alt=
     >>> df['Over_Grade'] = scores
     >>> meansTest(df, 'Location', 'Over_Grade', test='welch')
     >>> meansTest(df, 'Location', 'Over_Grade', test='james', order=1, iters=True)
+    >>> stats = GroupStats(df, 'Location', 'Over_Grade')
+    >>> meansTest(stats, 'Location', 'Over_Grade', test='fisher')
     
     References
     ----------
@@ -371,290 +906,83 @@ def meansTest(data, groups, scores, test, alpha=0.05, iters=False, order=2, alt=
     
     '''
     
-    names = {'fisher' : "Fisher one-way anova", 
-             'cochran': "Cochran for Means",
-             'welch' : "Welch one-way anova", 
-             'james' : "James test", 
-             'box' : "Box correction for Fisher", 
-             'scott-smith': "Scott and Smith", 
-             'brown-forsythe' : "Brown-Forsythe for Means", 
-             'alexander-govern' : "Alexander-Govern", 
-             'mehrotra' : "Mehrotra modified Brown-Forsythe", 
-             'hartung-agac-makabi' : "Hartung-Agac-Makabi adjusted Welch", 
-             'ozdemir-kurt' : "Özdermir-Kurt B2"}
-    
-    comment = None
+    if output not in _OUTPUTS:
+        raise ValueError("output must be 'pandas', 'tuple', or 'numpy', not " + repr(output))
     
     #sample size, mean, and variance per category
-    nj = data.groupby(groups)[scores].count()
-    meanj = data.groupby(groups)[scores].mean()
-    varj = data.groupby(groups)[scores].var()
-    res = pd.concat([nj, meanj, varj], axis=1)
-    res = res.set_axis(["n", "mean", "var"], axis=1, inplace=False)
+    if not isinstance(data, GroupStats):
+        data = GroupStats(data, groups, scores)
+    k, nj, meanj, varj = data.k, data.n, data.mean, data.var
     
-    #number of categories
-    k = len(res)
+    #several alpha levels, e.g. for multiple testing corrections
+    if np.ndim(alpha) > 0:
+        alphas = np.asarray(alpha, dtype=np.float64)
+        if alphas.ndim != 1 or alphas.size == 0:
+            raise ValueError("alpha must be a single value or a non-empty one-dimensional array of values")
+        return _alphaLevels(nj, meanj, varj, k, alphas, test, iters, order, alt, output)
     
-    #(first) degrees of freedom for many tests
-    if test=='fisher' or test=='box' or test=='cochran' or test=='welch' or test=='james' or test=='brown-forsythe' or test=='alexander-govern' or test=='hartung-agac-makabi' or test=='ozdemir-kurt':
-        df1 = k - 1
+    #test statistic and degrees of freedom
+    stat, df1, df2, pVal, Jcrit, comment = _testStats(test, nj, meanj, varj, k, alpha, iters, order, alt)
     
-    #weights (w), adjusted weights (h), weighted mean, and cochran test statistic
-    if test=='cochran' or test=='welch' or test=='james' or test=='alexander-govern' or test=='ozdemir-kurt' or test=='hartung-agac-makabi':
-        
-        if test=='hartung-agac-makabi':
-            if alt:
-                res['phi'] = (res['n'] - 1)/(res['n'] - 3)
-            else:
-                res['phi'] = (res['n'] + 2)/(res['n'] + 1)
-            res['w'] = res['n']/res['var'] * 1/res['phi']
-        else:
-            res['w'] = res['n']/res['var']
-        w = sum(res['w'])
-        res['h'] = res['w']/w
-        
-        yw = sum(res['h']*res['mean'])
-        
-        chi2Cochran = sum(res['w']*(res['mean'] - yw)**2)
-        
-        if test=='cochran':
-            chi2Stat = chi2Cochran
-    
-    #lambda
-    if test=='welch' or test=='james' or test=='hartung-agac-makabi':
-        lamb = sum((1 - res['h'])**2/(res['n'] - 1))
-        if test=='welch' or test=='hartung-agac-makabi':
-            Fstat = chi2Cochran / (k - 1 + 2*(k - 2)/(k + 1)*lamb)
-            df2 = (k**2 - 1)/(3*lamb)
-    
-    #overall sample size and mean
-    if test=='fisher' or test=='box' or test=='scott-smith' or test=='brown-forsythe' or test=='alexander-govern' or test=='mehrotra' or test=='ozdemir-kurt':
-        n = sum(res['n'])
-        mean = sum(res['n']*res['mean'])/n
-    
-    #the fisher test and box correction
-    if test=='fisher' or test=='box':
-        ssb = sum(res['n']*(res['mean'] - mean)**2)
-        ssw = variance(data[scores])*(n - 1) - ssb
-        df2 = n - k
-        Fstat = (ssb/df1)/(ssw/df2)
-        
-        if test=='box':
-            c = (n - k)/(n*(k - 1))*sum((n - res['n'])*res['var']) / sum((res['n'] - 1)*res['var'])
-            Fstat = Fstat/c
-            df1 = sum((n - res['n'])*res['var'])**2 / (sum(res['n']*res['var'])**2 + n*sum((n - 2*res['n'])*res['var']**2))
-            df2 = sum((res['n'] - 1)*res['var'])**2 / (sum((res['n'] - 1)*res['var']**2))
-    
-    #t-values
-    if test=='scott-smith' or test=='alexander-govern' or test=='ozdemir-kurt':
-        if test=='ozdemir-kurt' or test=='alexander-govern':
-            mean = yw
-        res['t'] = (res['mean'] - mean)/(res['var']/res['n'])**0.5
-    
-    #scott-smith test
-    if test=='scott-smith':
-        chi2Stat = sum((res['t']*((res['n'] - 3)/(res['n'] - 1))**0.5)**2)
-        df1 = k
-    
-    #brown-forsythe and mehrotra's adjustment
-    if test=='brown-forsythe' or test=='mehrotra':
-        Fstat = sum(res["n"]*(res["mean"] - mean)**2)/sum((1 - res["n"]/n)*res["var"])
-        df2 = sum((1 - res["n"]/n)*res["var"])**2/sum((1 - res['n']/n)**2*res['var']**2/(res['n'] - 1))
-        
-        if test=='mehrotra':
-            df1 = (sum(res['var']) - sum(res['n']*res['var'])/n)**2 / (sum(res['var']**2) + (sum(res['n']*res['var'])/n)**2 - 2*sum(res['n']*res['var']**2)/n)
-    
-    #alexander-govern test
-    if test=='alexander-govern':
-        res['a'] = res['n'] - 1.5
-        res['b'] = 48*res['a']**2
-        res['c'] = (res['a']*log(1 + res['t']**2/(res['n'] - 1)))**0.5
-        res['z'] = res['c'] + (res['c']**3 + 3*res['c'])/res['b'] - (4*res['c']**7 + 33*res['c']**5 + 240*res['c']**3 + 855*res['c'])/(10*res['b']**2 + 8*res['b']*res['c']**4 + 1000*res['b'])
-        chi2Stat = sum(res['z']**2)
-    
-    #ozdermir-kurt test
-    if test=='ozdemir-kurt':
-        res['v'] = res['n'] - 1
-        zCrit = NormalDist().inv_cdf(1-alpha/2)
-        res['c'] = (4*res['v']**2 + 5*(2*zCrit**2 + 3)/24)/(4*res['v']**2 + res['v'] + (4*zCrit**2 + 9)/12) * res['v']**0.5
-        res['z'] = res['c']*(log(1 + res['t']**2/res['v']))**0.5
-        chi2Stat = sum(res['z']**2)
-        
-        if iters:
-            comment = "using iterations for approximating p-value"
-            df = k - 1
-            pLow = 0
-            pHigh = 1
-            pVal = 0.05
-            nIter = 1
-            whileDo = True
-
-            while whileDo:
-                zCrit = NormalDist().inv_cdf(1-pVal/2)
-                #the c-values and z-values
-                res['c'] = (4*res['v']**2 + 5*(2*zCrit**2 + 3)/24)/(4*res['v']**2 + res['v'] + (4*zCrit**2 + 9)/12) * res['v']**0.5
-                res['z'] = res['c']*(log(1 + res['t']**2/res['v']))**0.5
-                chi2Stat = sum(res['z']**2)
-                chi2Crit = chi2.ppf(1-pVal, df)
-
-                if chi2Crit < chi2Stat:
-                    pHigh = pVal
-                    pVal = (pLow + pVal)/2
-                elif chi2Crit > chi2Stat:
-                    pLow = pVal
-                    pVal = (pHigh + pVal)/2
-
-                nIter = nIter + 1
-
-                if chi2Crit == chi2Stat or nIter >= 500:
-                    whileDo = False
-    
-    #james test
-    if test=='james':
-        J = chi2Cochran
-        
-        if order==0:
-            chi2Stat = J
-            pVal = chi2.sf(J, df1) 
-            reject = pVal < alpha
-            comment = "for large category sizes"
-            out = pd.DataFrame([[J, df1, pVal, reject]], columns=["statistic", "df1", "p-value", "reject H0"])
-            
-        else:
-            cCrit = chi2.ppf(1-alpha, df1)
-            
-            if order==1:
-                Jcrit = cCrit*(1 + (3*cCrit  + k + 1)/(2*(k**2 - 1))*lamb)
-                
-                if iters:
-                    comment = "first-order with iterations for p-value approximation"
-                    pLow = 0
-                    pHigh = 1
-                    pVal = 0.05
-                    nIter = 1
-                    whileDo = True
-                    
-                    while whileDo:
-                        cCrit = chi2.ppf(1-pVal, df1)
-                        Jcrit = cCrit*(1 + (3*cCrit  + k + 1)/(2*(k**2 - 1))*lamb)
-                        if Jcrit < J:
-                            pHigh = pVal
-                            pVal = (pLow + pVal)/2
-                        elif Jcrit > J:
-                            pLow = pVal
-                            pVal = (pHigh + pVal)/2
-
-                        nIter = nIter + 1
-
-                        if Jcrit == J or nIter >= 800:
-                            whileDo = False
-                            
-                    reject = pVal < alpha
-                    out = pd.DataFrame([[J, df1, pVal, reject]], columns=["statistic", "df1", "p-value", "reject H0"])
-                            
-                else:
-                    comment = "first-order"
-                    reject = J > Jcrit
-                    out = pd.DataFrame([[J, df1, Jcrit, reject]], columns=["statistic", "df1", "J-critical", "reject H0"])
-                            
-                            
-            else:
-                if not(alt):
-                    comment = "second order"
-                    res['v'] = res['n'] - 2
-                    lamb = sum((1 - res['h'])**2/res['v'])
-                else:
-                    comment = "second order with alternative v (v = n -1)"
-                    res['v'] = res['n'] - 1
-                    
-                R10 = sum(res['h']**0 / res['v']**1)
-                R11 = sum(res['h']**1 / res['v']**1)
-                R12 = sum(res['h']**2 / res['v']**1)
-                R20 = sum(res['h']**0 / res['v']**2)
-                R21 = sum(res['h']**1 / res['v']**2)
-                R22 = sum(res['h']**2 / res['v']**2)
-                R23 = sum(res['h']**3 / res['v']**2)
-                
-                c2 = cCrit**1/(k + 2*1 - 3)
-                c4 = c2 * cCrit/(k + 2*2 - 3)
-                c6 = c4 * cCrit/(k + 2*3 - 3)
-                c8 = c6 * cCrit/(k + 2*4 - 3)
-                
-                Jcrit = cCrit + 1/2*(3*c4+c2)*lamb + \
-                1/16*(3*c4 + c2 )**2*(1-(k-3)/cCrit)*lamb**2 + \
-                1/2*(3*c4 + c2 )*\
-                ((8*R23 - 10*R22 + 4*R21 - 6*R12**2 + 8*R12*R11 - 4*R11**2) + \
-                 (2*R23 - 4*R22 + 2*R21 - 2*R12**2 + 4*R12*R11 - 2*R11**2)*(c2 - 1) + \
-                 1/4*(-R12**2 + 4*R12*R11 - 2*R12*R10 - 4*R11**2 + 4*R11*R10 - R10**2 )*(3*c4 - 2*c2 - 1)) + \
-                (R23 - 3*R22 + 3*R21 - R20)*(5*c6 + 2*c4 + c2) + \
-                3/16*(R12**2 - 4*R23 + 6*R22 - 4*R21 + R20)*(35*c8 + 15*c6 + 9*c4 + 5*c2) + \
-                1/16*(-2*R22**2 + 4*R21 - R20 + 2*R12*R10 - 4*R11*R10 + R10**2)*(9*c8 - 3*c6 - 5*c4 - c2) + \
-                1/4*(-R22 + R11**2 )*(27*c8 + 3*c6 + c4 + c2) + \
-                1/4*(R23 - R12*R11)*(45*c8 + 9*c6 + 7*c4 + 3*c2)
-                
-                if iters:
-                    comment = comment + ", using iterations for p-value approximation"
-                    pLow = 0
-                    pHigh = 1
-                    pVal = 0.05
-                    nIter = 1
-                    whileDo = True
-                    
-                    while whileDo:
-                        cCrit = chi2.ppf(1-pVal, df1)
-
-                        #(re)calculate chi values
-                        c2 = cCrit**1/(k + 2*1 - 3)
-                        c4 = c2 * cCrit/(k + 2*2 - 3)
-                        c6 = c4 * cCrit/(k + 2*3 - 3)
-                        c8 = c6 * cCrit/(k + 2*4 - 3)
-
-                        #calculate Jcrit
-                        Jcrit = cCrit + 1/2*(3*c4+c2)*lamb + \
-                        1/16*(3*c4 + c2 )**2*(1-(k-3)/cCrit)*lamb**2 + \
-                        1/2*(3*c4 + c2 )*\
-                        ((8*R23 - 10*R22 + 4*R21 - 6*R12**2 + 8*R12*R11 - 4*R11**2) + \
-                         (2*R23 - 4*R22 + 2*R21 - 2*R12**2 + 4*R12*R11 - 2*R11**2)*(c2 - 1) + \
-                         1/4*(-R12**2 + 4*R12*R11 - 2*R12*R10 - 4*R11**2 + 4*R11*R10 - R10**2 )*(3*c4 - 2*c2 - 1)) + \
-                        (R23 - 3*R22 + 3*R21 - R20)*(5*c6 + 2*c4 + c2) + \
-                        3/16*(R12**2 - 4*R23 + 6*R22 - 4*R21 + R20)*(35*c8 + 15*c6 + 9*c4 + 5*c2) + \
-                        1/16*(-2*R22**2 + 4*R21 - R20 + 2*R12*R10 - 4*R11*R10 + R10**2)*(9*c8 - 3*c6 - 5*c4 - c2) + \
-                        1/4*(-R22 + R11**2 )*(27*c8 + 3*c6 + c4 + c2) + \
-                        1/4*(R23 - R12*R11)*(45*c8 + 9*c6 + 7*c4 + 3*c2)
-
-                        if Jcrit < J:
-                            pHigh = pVal
-                            pVal = (pLow + pVal)/2
-                        elif Jcrit > J:
-                            pLow = pVal
-                            pVal = (pHigh + pVal)/2
-
-                        nIter = nIter + 1
-
-                        if Jcrit == J or nIter >= 500:
-                            whileDo = False
-                    
-                    reject = pVal < alpha
-                    out = pd.DataFrame([[J, df1, pVal, reject]], columns=["statistic", "df1", "p-value", "reject H0"])
-                    
-                else:
-                    reject = J > Jcrit
-                    out = pd.DataFrame([[J, df1, Jcrit, reject]], columns=["statistic", "df1", "J-critical", "reject H0"])
-    
-    #p-values for F-distribution tests
-    if test=='fisher' or test=='box' or test=='welch' or test=='box' or test=='brown-forsythe' or test=='mehrotra' or test=='hartung-agac-makabi':
-        pVal = f.sf(Fstat, df1, df2)
-        reject = pVal < alpha
-        out = pd.DataFrame([[Fstat, df1, df2, pVal, reject]], columns=["statistic", "df1", "df2", "p-value", "reject H0"])
+    #p-value and rejection of the null hypothesis
+    pVal, reject, row, cols = _HANDLERS[test](stat, df1, df2, pVal, Jcrit, alpha)
     
-    #p-value for chi-square distribution tests
-    if test=='cochran' or test=='scott-smith' or test=='alexander-govern' or test=='ozdemir-kurt':
-        pVal = chi2.sf(chi2Stat, df1)
-        reject = pVal < alpha
-        out = pd.DataFrame([[chi2Stat, df1, pVal, reject]], columns=["statistic", "df1", "p-value", "reject H0"])
+    name = _NAMES[test]
+    if output=='tuple':
+        return TestResult(stat, df1, df2, pVal, Jcrit, reject, name, comment)
+    if output=='numpy':
+        return np.array([_record(stat, df1, df2, pVal, Jcrit, reject)], dtype=_RESULT_DTYPE)
+    
+    out = pd.DataFrame([row + [name, comment]], columns=cols)
+    
+    return out
+
+def meansTestBatch(test, stats, df1, df2=None, alpha=0.05):
+    '''
+    meansTestBatch
+    
+    p-values and rejections for many test statistics of the same test at once, for example from a permutation or simulation study.
+    
+    Parameters
+    ----------
+    test : string
+        the test the statistics are from, see meansTest. For 'james' the statistics are assumed to be from the large sample approximation (order=0)
+    stats : array-like
+        the test statistics
+    df1 : integer or array-like
+        the (first) degrees of freedom
+    df2 : float or array-like, optional
+        the second degrees of freedom. Required for, and only used by, the tests with an F-distribution
+    alpha : float between 0 and 1
+        Alpha level to be used
+    
+    Returns
+    -------
+    out : Pandas dataframe
+        a dataframe with one row per test statistic, with the test-statistic value, degrees of freedom, p-value, and a boolean to reject the null hypothesis or not (based on the alpha level)
+    
+    Examples
+    ---------
+    >>> meansTestBatch('welch', [3.2, 1.1, 5.7], 2, [29.4, 30.1, 28.8])
+    
+    '''
+    
+    if test not in _NAMES:
+        raise ValueError("unknown test " + repr(test) + ", options are " + ", ".join(map(repr, _NAMES)))
+    if test in _F_TESTS and df2 is None:
+        raise ValueError("the " + _NAMES[test] + " has an F-distribution, so df2 is needed")
+    
+    stats = np.asarray(stats, dtype=np.float64)
+    
+    #one vectorized distribution call and comparison for all statistics
+    if test in _F_TESTS:
+        pVal = fdtrc(df1, df2, stats)
+        out = {"statistic" : stats, "df1" : np.broadcast_to(df1, stats.shape), "df2" : np.broadcast_to(df2, stats.shape)}
+    else:
+        pVal = chdtrc(df1, stats)
+        out = {"statistic" : stats, "df1" : np.broadcast_to(df1, stats.shape)}
     
-    name = names[test]
-    out['test'] = name
-    out['comment'] = comment
+    out["p-value"] = pVal
+    out["reject H0"] = np.less(pVal, alpha)
     
-    return out
\ No newline at end of file
+    return pd.DataFrame(out)